@@ -1,25 +1,108 @@
 import os
+import re
 import sqlite3
 import requests
 import datetime
-import json
 import uuid
+import orjson
 import secrets
+import hashlib
+import zlib
+import threading
+import time
+import queue
+import atexit
+import logging
 from datetime import timedelta
-from flask import Flask, request, jsonify, render_template_string, session, make_response, redirect, url_for
+from flask import Flask, request, jsonify, render_template, render_template_string, session, redirect, url_for
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+from flask_compress import Compress
+from prometheus_client import Histogram, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+from prometheus_client import multiprocess
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
 from functools import wraps
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 
 load_dotenv()
 
+# Application logging; LOG_LEVEL=DEBUG also logs the query sent for each search
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+# SERP API URLs carry api_key in the query string; strip query strings from any text
+# that may be logged or returned so the key never leaks
+_URL_QUERY_RE = re.compile(r'\?[^\s\'"]*')
+
+def redact_url_queries(text):
+    """Replace every URL query string in text with a placeholder"""
+    return _URL_QUERY_RE.sub('?<redacted>', text)
+
+class RedactUrlQueryFilter(logging.Filter):
+    """Logging filter that redacts URL query strings from a record's message"""
+    def filter(self, record):
+        message = record.getMessage()
+        if '?' in message:
+            record.msg = redact_url_queries(message)
+            record.args = ()
+        return True
+
+# urllib3 logs request URLs (retries at WARNING, every request at DEBUG)
+for _urllib3_logger in ('urllib3.connectionpool', 'urllib3.util.retry'):
+    logging.getLogger(_urllib3_logger).addFilter(RedactUrlQueryFilter())
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, used by jsonify and request.get_json"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of round-tripping through str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS),
+                                        mimetype='application/json')
+
 app = Flask(__name__)
-CORS(app, origins=['http://localhost:5000', 'https://*.replit.app', 'https://*.replit.dev'])
+app.json = OrjsonProvider(app)
+
+# Number of reverse proxies in front of the app (Replit's router by default); ProxyFix
+# takes the client address from the X-Forwarded-For entry the nearest proxy appended
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '1'))
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+# Allowed CORS origins: local development plus any Replit subdomain, anchored so
+# lookalike hosts (e.g. replit.app.example.com) are rejected
+ALLOWED_ORIGINS = re.compile(r'^(http://localhost:5000|https://[^/]+\.replit\.(app|dev))$', re.IGNORECASE)
+CORS(app, origins=[ALLOWED_ORIGINS])
+
+# Compress JSON and HTML responses; small bodies aren't worth the overhead
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_LEVEL'] = 5
+app.config['COMPRESS_BR_LEVEL'] = 5
+Compress(app)
 
 # Get SERP API key from environment
 SERPAPI_KEY = os.getenv('SERPAPI_API_KEY')
 
+# Constant SERP API search parameters; search() adds the query and country
+SERP_SEARCH_PARAMS = {
+    'api_key': SERPAPI_KEY,
+    'engine': 'google',
+    'num': 10
+}
+
 # Monthly SERP API limit from environment (default 10,000)
 SERPAPI_MONTHLY_LIMIT = int(os.getenv('SERPAPI_MONTHLY_LIMIT', '10000'))
 
@@ -29,14 +112,160 @@ ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin123')
 # Terminal password (set via environment)
 TERMINAL_PASSWORD = os.getenv('TERMINAL_PASSWORD', 'terminal456')
 
+# Longest search query forwarded to the SERP API
+MAX_QUERY_LENGTH = 512
+
+# Country codes accepted for the SERP API 'gl' parameter
+VALID_COUNTRIES = frozenset({'us', 'gb', 'ca', 'au', 'de', 'fr', 'jp', 'cn', 'in', 'br', 'mx', 'ru', 'it', 'es', 'nl'})
+
+# US, Canada, Australia - the state/province is added to the query for better location targeting
+STATE_COUNTRIES = frozenset({'us', 'ca', 'au'})
+
+# Search type -> query template; {q} is replaced with the search subject
+SEARCH_MODIFIERS = {
+    'criminal': '"{q}" (arrest OR criminal OR conviction OR mugshot OR court)',
+    'court': '"{q}" (lawsuit OR court case OR civil OR judgment)',
+    'warrants': '"{q}" (warrant OR wanted OR fugitive)',
+    'bankruptcy': '"{q}" (bankruptcy OR chapter 7 OR chapter 11 OR debt)',
+    'property': '"{q}" (property records OR real estate OR deed OR owner)',
+    'deeds': '"{q}" (deed OR mortgage OR property transfer)',
+    'foreclosure': '"{q}" (foreclosure OR tax lien OR sheriff sale)',
+    'business_property': '"{q}" (commercial property OR business real estate)',
+    'birth': '"{q}" (birth certificate OR birth record OR born)',
+    'death': '"{q}" (death certificate OR obituary OR died OR deceased)',
+    'marriage': '"{q}" (marriage certificate OR wedding OR married OR divorce)',
+    'address': '"{q}" (address OR residence OR lived OR home)',
+    'phone': '"{q}" (phone number OR telephone OR contact)',
+    'licenses': '"{q}" (professional license OR certification OR permit)',
+    'business': '"{q}" (business registration OR LLC OR corporation OR company)',
+    'employment': '"{q}" (employment OR job OR work OR employer)',
+    'education': '"{q}" (education OR school OR university OR degree OR alumni)',
+    'patents': '"{q}" (patent OR trademark OR intellectual property)',
+    'assets': '"{q}" (assets OR wealth OR financial OR investments)',
+    'corporations': '"{q}" (corporation OR SEC filing OR executive OR officer)',
+    'sec': '"{q}" (SEC filing OR insider trading OR executive compensation)',
+    'tax': '"{q}" (tax records OR IRS OR tax lien OR assessment)',
+    'vehicles': '"{q}" (vehicle registration OR car OR license plate)',
+    'drivers': '"{q}" (drivers license OR driving record OR DMV OR DUI)',
+    'aviation': '"{q}" (aircraft registration OR pilot license OR FAA)',
+    'social': '"{q}" (Facebook OR Twitter OR Instagram OR LinkedIn OR social media)',
+    'online': '"{q}" (username OR profile OR account OR online)',
+    'breaches': '"{q}" (data breach OR password leak OR hack OR exposed)',
+    'websites': '"{q}" (domain registration OR website owner OR WHOIS)',
+    'medical': '"{q}" (medical license OR doctor OR physician OR MD)',
+    'sanctions': '"{q}" (medical sanctions OR excluded provider OR Medicare fraud)',
+    'prescribers': '"{q}" (DEA prescriber OR controlled substance OR prescription)',
+    'news_criminal': '"{q}" (arrested OR charged OR convicted OR crime news)',
+    'news_business': '"{q}" (CEO OR executive OR business news OR scandal)',
+    'investigations': '"{q}" (investigation OR expose OR corruption OR fraud)',
+    'media': '"{q}" (interview OR news OR media OR press OR appearance)',
+    'academic': '"{q}" (research OR publication OR academic OR scholar)',
+    'research': '"{q}" (research paper OR citation OR study OR journal)',
+    'grants': '"{q}" (research grant OR funding OR NSF OR NIH)',
+    'university': '"{q}" (university OR college OR alumni OR faculty)',
+    'military': '"{q}" (military service OR veteran OR armed forces)',
+    'immigration': '"{q}" (immigration OR visa OR naturalization OR USCIS)',
+    'political': '"{q}" (political contribution OR campaign OR PAC OR lobbying)',
+    'nonprofit': '"{q}" (nonprofit OR charity OR 501c3 OR foundation)',
+    'voter': '"{q}" (voter registration OR voting record OR election)'
+}
+
+# Bound template.format methods, so a search does one lookup and one call
+SEARCH_MODIFIER_FORMATTERS = {name: template.format for name, template in SEARCH_MODIFIERS.items()}
+
+# Largest accepted request body; a search payload is a few hundred bytes, so Werkzeug
+# refuses anything bigger with 413 before it is read or parsed
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024
+
 # Flask secret key for sessions
 app.secret_key = os.getenv('FLASK_SECRET_KEY', secrets.token_hex(32))
 
+# Shared HTTP session so SERP API calls reuse pooled keep-alive connections
+# instead of paying a TCP + TLS handshake on every search. Failed connections are
+# retried, and a 5xx once, but a request that timed out reading is never resent:
+# it may already have been billed. Worst case for a search is one connect timeout
+# plus two slow 5xx responses, under 25s.
+SERP_SESSION = requests.Session()
+SERP_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=64,
+    max_retries=Retry(total=2, read=False, status=1, backoff_factor=0.2,
+                      status_forcelist=frozenset({500, 502, 503, 504}),
+                      allowed_methods=frozenset({'GET'}), raise_on_status=False)
+))
+# Forked workers (Gunicorn preload) must not share the parent's pooled sockets
+os.register_at_fork(after_in_child=SERP_SESSION.close)
+
+# (connect, read) timeouts for the paid search and the account usage calls
+SERP_SEARCH_TIMEOUT = (3.05, 10)
+SERP_ACCOUNT_TIMEOUT = (3.05, 3)
+
+# Per-stage latency of /search, exposed at /metrics
+SEARCH_STAGE_SECONDS = Histogram(
+    'osint_search_stage_seconds',
+    'Time spent in each stage of a /search request',
+    ['stage']
+)
+UPSTREAM_SECONDS = SEARCH_STAGE_SECONDS.labels('upstream')
+PARSE_SECONDS = SEARCH_STAGE_SECONDS.labels('parse')
+PROJECT_SECONDS = SEARCH_STAGE_SECONDS.labels('project')
+SERIALIZE_SECONDS = SEARCH_STAGE_SECONDS.labels('serialize')
+TOTAL_SECONDS = SEARCH_STAGE_SECONDS.labels('total')
+
+# Per-connection SQLite settings: with WAL, synchronous=NORMAL commits without an
+# fsync per transaction and stays crash-safe; temp tables and mmap reads skip the disk
+SQLITE_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-20000',
+)
+
+def connect_db(**kwargs):
+    """Open a connection to the search database with the tuned pragmas applied"""
+    conn = sqlite3.connect('osint_searches.db', **kwargs)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+# Each request thread keeps one autocommit connection for its lifetime instead of
+# connecting per query; multi-statement reads open their own transaction. A thread's
+# connection is closed with its thread-local storage when the thread exits.
+# Request connections never checkpoint the WAL: the search log writer commits after
+# nearly every search and checkpoints off the response path instead.
+_db_local = threading.local()
+
+def get_db():
+    """Return this thread's database connection, opening it on first use"""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        conn = _db_local.conn = connect_db(isolation_level=None)
+        conn.execute('PRAGMA wal_autocheckpoint=0')
+    return conn
+
+@app.teardown_appcontext
+def _rollback_db(exc):
+    # A request that failed inside BEGIN must not leave the shared connection mid-transaction
+    conn = getattr(_db_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+def _reset_db_after_fork():
+    # Connections inherited from the parent must not be used by a forked worker
+    global _db_local
+    _db_local = threading.local()
+
+os.register_at_fork(after_in_child=_reset_db_after_fork)
+
 # Initialize database
 def init_database():
-    conn = sqlite3.connect('osint_searches.db')
+    conn = connect_db()
     cursor = conn.cursor()
     
+    # WAL lets the history/stats readers run alongside the log writer; the
+    # journal mode is stored in the database file, so it only needs setting once
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
     # Enhanced search logs table with client tracking
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS search_logs (
@@ -54,7 +283,8 @@ def init_database():
             targeted_query TEXT,
             state TEXT,
             status_code INTEGER DEFAULT 200,
-            serp_cost_cents INTEGER DEFAULT 0
+            serp_cost_cents INTEGER DEFAULT 0,
+            cached BOOLEAN DEFAULT 0
         )
     ''')
     
@@ -102,14 +332,112 @@ def init_database():
         )
     ''')
     
+    # Processed search results shared by every worker (zlib-compressed JSON)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS serp_cache (
+            key TEXT PRIMARY KEY,
+            payload BLOB NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_serp_cache_created_at ON serp_cache(created_at)')
+    
+    # Index for search history paging
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_search_logs_timestamp ON search_logs(timestamp)')
+    
+    # Running totals for /search-stats, kept current by triggers on search_logs so
+    # the stats never have to aggregate the whole log
+    cursor.execute('CREATE TABLE IF NOT EXISTS stats_totals (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+    cursor.execute('CREATE TABLE IF NOT EXISTS stats_by_query (query TEXT PRIMARY KEY, count INTEGER NOT NULL)')
+    cursor.execute('CREATE TABLE IF NOT EXISTS stats_by_country (country TEXT PRIMARY KEY, count INTEGER NOT NULL)')
+    cursor.execute('CREATE TABLE IF NOT EXISTS stats_by_day (date TEXT PRIMARY KEY, count INTEGER NOT NULL)')
+    cursor.execute('CREATE TABLE IF NOT EXISTS stats_ips (ip_address TEXT PRIMARY KEY) WITHOUT ROWID')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stats_by_query_count ON stats_by_query(count)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stats_by_country_count ON stats_by_country(count)')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS search_logs_stats_insert AFTER INSERT ON search_logs
+        BEGIN
+            INSERT INTO stats_totals (key, value) VALUES ('total_searches', 1)
+                ON CONFLICT(key) DO UPDATE SET value = value + 1;
+            INSERT INTO stats_by_day (date, count) VALUES (DATE(NEW.timestamp), 1)
+                ON CONFLICT(date) DO UPDATE SET count = count + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS search_logs_stats_success AFTER INSERT ON search_logs
+        WHEN NEW.success = 1
+        BEGIN
+            INSERT INTO stats_totals (key, value) VALUES ('successful_searches', 1)
+                ON CONFLICT(key) DO UPDATE SET value = value + 1;
+            INSERT INTO stats_by_query (query, count) VALUES (NEW.query, 1)
+                ON CONFLICT(query) DO UPDATE SET count = count + 1;
+            INSERT INTO stats_by_country (country, count) VALUES (NEW.country, 1)
+                ON CONFLICT(country) DO UPDATE SET count = count + 1;
+        END
+    ''')
+    # Every address is recorded once; only a genuinely new one bumps unique_ips
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS search_logs_stats_ip AFTER INSERT ON search_logs
+        BEGIN
+            INSERT OR IGNORE INTO stats_ips (ip_address) VALUES (NEW.ip_address);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS stats_ips_insert AFTER INSERT ON stats_ips
+        BEGIN
+            INSERT INTO stats_totals (key, value) VALUES ('unique_ips', 1)
+                ON CONFLICT(key) DO UPDATE SET value = value + 1;
+        END
+    ''')
+    
     conn.commit()
     conn.close()
 
+# Bump when migrate_database() gains a step so existing databases run it once
+SCHEMA_VERSION = 4
+
+def rebuild_search_stats(cursor):
+    """Recompute the stats_* counter tables from the full search log"""
+    # stats_ips is filled before stats_totals is reset, so whatever its insert
+    # trigger adds to unique_ips is discarded and replaced by the exact count
+    cursor.execute('DELETE FROM stats_ips')
+    cursor.execute('INSERT INTO stats_ips (ip_address) SELECT DISTINCT ip_address FROM search_logs')
+    for table in ('stats_totals', 'stats_by_query', 'stats_by_country', 'stats_by_day'):
+        cursor.execute(f'DELETE FROM {table}')
+    cursor.execute('''
+        INSERT INTO stats_totals (key, value)
+        SELECT 'total_searches', COUNT(*) FROM search_logs
+        UNION ALL
+        SELECT 'successful_searches', COUNT(*) FROM search_logs WHERE success = 1
+        UNION ALL
+        SELECT 'unique_ips', COUNT(*) FROM stats_ips
+    ''')
+    cursor.execute('''
+        INSERT INTO stats_by_query (query, count)
+        SELECT query, COUNT(*) FROM search_logs WHERE success = 1 GROUP BY query
+    ''')
+    cursor.execute('''
+        INSERT INTO stats_by_country (country, count)
+        SELECT country, COUNT(*) FROM search_logs WHERE success = 1 GROUP BY country
+    ''')
+    cursor.execute('''
+        INSERT INTO stats_by_day (date, count)
+        SELECT DATE(timestamp), COUNT(*) FROM search_logs GROUP BY DATE(timestamp)
+    ''')
+
 def migrate_database():
     """Add missing columns to existing database"""
-    conn = sqlite3.connect('osint_searches.db')
+    conn = connect_db()
     cursor = conn.cursor()
     
+    # Skip the column checks once this database is at the current schema version
+    cursor.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY)')
+    cursor.execute('SELECT MAX(version) FROM schema_version')
+    current_version = cursor.fetchone()[0] or 0
+    if current_version >= SCHEMA_VERSION:
+        conn.close()
+        return
+    
     # Check if columns exist and add them if missing
     cursor.execute("PRAGMA table_info(search_logs)")
     columns = [column[1] for column in cursor.fetchall()]
@@ -120,108 +448,146 @@ def migrate_database():
         'targeted_query': 'TEXT',
         'state': 'TEXT',
         'status_code': 'INTEGER DEFAULT 200',
-        'serp_cost_cents': 'INTEGER DEFAULT 0'
+        'serp_cost_cents': 'INTEGER DEFAULT 0',
+        'cached': 'BOOLEAN DEFAULT 0'
     }
     
     for column_name, column_def in missing_columns.items():
         if column_name not in columns:
             try:
                 cursor.execute(f'ALTER TABLE search_logs ADD COLUMN {column_name} {column_def}')
-                print(f"Added column: {column_name}")
+                logger.info("Added column: %s", column_name)
             except sqlite3.OperationalError as e:
-                print(f"Column {column_name} may already exist: {e}")
+                logger.warning("Column %s may already exist: %s", column_name, e)
+    
+    # Version 4: per-client index for the daily rate-limit count and the admin client
+    # list join; created here because legacy databases only gain client_id above
+    if current_version < 4:
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_search_logs_client_success_ts ON search_logs(client_id, success, timestamp)')
+    
+    # Versions 2 and 3: seed the stats counters from the logs written before their triggers existed
+    if current_version < 3:
+        rebuild_search_stats(cursor)
+    if current_version < 2:
+        # The stats no longer group the log, so its partial stats indexes only cost writes
+        cursor.execute('DROP INDEX IF EXISTS idx_search_logs_success_query')
+        cursor.execute('DROP INDEX IF EXISTS idx_search_logs_success_country')
     
+    cursor.execute('INSERT OR IGNORE INTO schema_version (version) VALUES (?)', (SCHEMA_VERSION,))
     conn.commit()
     conn.close()
 
 # Client management functions
+def get_request_client_id(request_obj):
+    """Return the client_id from the request's cookie or X-Client-Id header, or a new one"""
+    return request_obj.cookies.get('client_id') or request_obj.headers.get('X-Client-Id') or str(uuid.uuid4())
+
+def register_client(cursor, client_id, request_obj):
+    """Create the client unless it already exists (client_id is UNIQUE)"""
+    cursor.execute('''
+        INSERT OR IGNORE INTO clients (client_id, first_ip, first_user_agent) 
+        VALUES (?, ?, ?)
+    ''', (client_id, get_client_ip(request_obj), request_obj.user_agent.string))
+
 def get_or_create_client(request_obj):
     """Get or create client based on client_id cookie/header"""
-    client_id = request_obj.cookies.get('client_id') or request_obj.headers.get('X-Client-Id')
-    
-    if not client_id:
-        # Generate new client ID
-        client_id = str(uuid.uuid4())
-        
-    # Check if client exists
-    conn = sqlite3.connect('osint_searches.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM clients WHERE client_id = ?', (client_id,))
-    client = cursor.fetchone()
-    
-    if not client:
-        # Create new client
-        ip_address = get_client_ip(request_obj)
-        user_agent = request_obj.headers.get('User-Agent', '')
-        
-        cursor.execute('''
-            INSERT INTO clients (client_id, first_ip, first_user_agent) 
-            VALUES (?, ?, ?)
-        ''', (client_id, ip_address, user_agent))
-        
-        conn.commit()
-    
-    conn.close()
+    client_id = get_request_client_id(request_obj)
+    register_client(get_db().cursor(), client_id, request_obj)
     return client_id
 
 def get_client_ip(request_obj):
     """Extract client IP from request"""
-    forwarded_for = request_obj.environ.get('HTTP_X_FORWARDED_FOR', '')
-    if forwarded_for:
-        return forwarded_for.split(',')[0].strip()
-    return request_obj.environ.get('REMOTE_ADDR', 'unknown')
+    # X-Forwarded-For has already been resolved by ProxyFix
+    return request_obj.remote_addr or 'unknown'
+
+def get_user_agent(request_obj):
+    """Return the client's User-Agent, trimmed for logging"""
+    return request_obj.user_agent.string[:500] or 'unknown'
 
 def check_rate_limit(client_id):
     """Check if client has exceeded daily rate limit"""
-    conn = sqlite3.connect('osint_searches.db')
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
     
     # Get client settings
     cursor.execute('SELECT daily_limit, unlimited, unlimited_until FROM clients WHERE client_id = ?', (client_id,))
-    client_settings = cursor.fetchone()
-    
+    return rate_limit_status(cursor, client_id, cursor.fetchone())
+
+def rate_limit_status(cursor, client_id, client_settings):
+    """Evaluate a client's (daily_limit, unlimited, unlimited_until) settings against today's usage"""
     if not client_settings:
-        conn.close()
         return False, "Client not found"
     
     daily_limit, unlimited, unlimited_until = client_settings
     
     # Check if client has unlimited access
     if unlimited:
-        conn.close()
         return True, "Unlimited access"
     
     if unlimited_until:
         try:
             until_date = datetime.datetime.fromisoformat(unlimited_until)
             if datetime.datetime.now() < until_date:
-                conn.close()
                 return True, f"Unlimited until {unlimited_until}"
         except:
             pass
     
     # Check daily usage
-    today_start = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    # search_logs timestamps are CURRENT_TIMESTAMP (UTC), so the day starts at UTC midnight,
+    # matching the DATE('now') day used by the stats counters
+    today_start = datetime.datetime.now(datetime.timezone.utc).date().isoformat() + ' 00:00:00'
     cursor.execute('''
         SELECT COUNT(*) FROM search_logs 
-        WHERE client_id = ? AND datetime(timestamp) >= datetime(?) AND success = 1
-    ''', (client_id, today_start.strftime('%Y-%m-%d %H:%M:%S')))
+        WHERE client_id = ? AND success = 1 AND timestamp >= ?
+    ''', (client_id, today_start))
     
     daily_usage = cursor.fetchone()[0]
-    conn.close()
     
     if daily_usage >= daily_limit:
         return False, f"Daily limit exceeded ({daily_usage}/{daily_limit})"
     
     return True, f"Usage: {daily_usage}/{daily_limit}"
 
-def get_serp_usage():
-    """Get current month SERP API usage"""
+def prepare_search_context(request_obj):
+    """Identify the client, registering it if new, and check its daily rate limit.
+
+    Equivalent to get_or_create_client() followed by check_rate_limit(), but the
+    client row is read once and only written for new clients.
+    Returns (client_id, allowed, limit_msg).
+    """
+    client_id = get_request_client_id(request_obj)
+    cursor = get_db().cursor()
+    
+    cursor.execute('SELECT daily_limit, unlimited, unlimited_until FROM clients WHERE client_id = ?', (client_id,))
+    client_settings = cursor.fetchone()
+    
+    if not client_settings:
+        # New client: register it and read back the default settings
+        register_client(cursor, client_id, request_obj)
+        cursor.execute('SELECT daily_limit, unlimited, unlimited_until FROM clients WHERE client_id = ?', (client_id,))
+        client_settings = cursor.fetchone()
+    
+    allowed, limit_msg = rate_limit_status(cursor, client_id, client_settings)
+    return client_id, allowed, limit_msg
+
+# SERP account usage is cached briefly so every search doesn't pay for an extra
+# account.json round-trip; an exhausted quota is remembered for longer
+SERP_USAGE_TTL = int(os.getenv('SERP_USAGE_TTL', '60'))
+SERP_USAGE_EXCEEDED_TTL = int(os.getenv('SERP_USAGE_EXCEEDED_TTL', '300'))
+
+# 'refresh' is an Event while a fetch is in flight and 'future' the pending prefetch;
+# the lock only guards these fields and is never held across the account API call
+_serp_usage_cache = {'data': None, 'expires': 0, 'refresh': None, 'future': None}
+_serp_usage_lock = threading.Lock()
+
+# Refreshes run here so a search can do its database work while the account API responds
+_serp_usage_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='serp-usage')
+
+def fetch_serp_usage():
+    """Get current month SERP API usage from the account API"""
     try:
-        response = requests.get(f'https://serpapi.com/account.json?api_key={SERPAPI_KEY}')
+        response = SERP_SESSION.get('https://serpapi.com/account.json', params={'api_key': SERPAPI_KEY}, timeout=SERP_ACCOUNT_TIMEOUT)
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             return {
                 'monthly_limit': data.get('searches_per_month', 0),
                 'used_this_month': data.get('this_month_usage', 0),
@@ -229,10 +595,71 @@ def get_serp_usage():
                 'plan_name': data.get('plan_name', 'Unknown')
             }
     except Exception as e:
-        print(f"Error checking SERP usage: {e}")
+        logger.warning("Error checking SERP usage: %s", redact_url_queries(str(e)))
     
     return {'error': 'Unable to fetch SERP usage'}
 
+def get_serp_usage():
+    """Get current month SERP API usage, cached for SERP_USAGE_TTL seconds.
+
+    While another thread is refreshing it, the stale value is returned instead of waiting.
+    """
+    with _serp_usage_lock:
+        data = _serp_usage_cache['data']
+        if data is not None and time.time() < _serp_usage_cache['expires']:
+            return dict(data)
+        refresh = _serp_usage_cache['refresh']
+        if refresh is not None and data is not None:
+            return dict(data)
+        if refresh is None:
+            refresh = _serp_usage_cache['refresh'] = threading.Event()
+            owner = True
+        else:
+            owner = False
+    
+    # Nothing cached yet and another thread is fetching: wait for its result
+    if not owner:
+        refresh.wait()
+        with _serp_usage_lock:
+            return dict(_serp_usage_cache['data'])
+    
+    usage = {'error': 'Unable to fetch SERP usage'}
+    try:
+        usage = fetch_serp_usage()
+    finally:
+        exceeded = 'error' not in usage and usage['remaining'] <= 0
+        with _serp_usage_lock:
+            _serp_usage_cache['data'] = usage
+            _serp_usage_cache['expires'] = time.time() + (SERP_USAGE_EXCEEDED_TTL if exceeded else SERP_USAGE_TTL)
+            _serp_usage_cache['refresh'] = None
+        refresh.set()
+    return dict(usage)
+
+def prefetch_serp_usage():
+    """Start refreshing SERP usage in the background if the cached value has expired.
+
+    Returns a future for get_serp_usage(), shared by every caller while it is pending,
+    or None when the cached value is still fresh.
+    """
+    with _serp_usage_lock:
+        if _serp_usage_cache['data'] is not None and time.time() < _serp_usage_cache['expires']:
+            return None
+        future = _serp_usage_cache['future']
+        if future is None or future.done():
+            future = _serp_usage_cache['future'] = _serp_usage_executor.submit(get_serp_usage)
+        return future
+
+def record_serp_search():
+    """Count a paid SERP API search against the cached usage until the next refresh"""
+    with _serp_usage_lock:
+        usage = _serp_usage_cache['data']
+        if usage is None or 'error' in usage:
+            return
+        usage['used_this_month'] += 1
+        usage['remaining'] -= 1
+        if usage['remaining'] <= 0:
+            _serp_usage_cache['expires'] = time.time() + SERP_USAGE_EXCEEDED_TTL
+
 # Authentication decorators
 def require_admin(f):
     @wraps(f)
@@ -242,38 +669,279 @@ def require_admin(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def substitute_self_reference(query, client_id):
-    """Replace @s with client's self_subject"""
+def substitute_self_reference(query, self_subject):
+    """Replace @s with the client's self_subject"""
     if '@s' not in query:
         return query
     
-    conn = sqlite3.connect('osint_searches.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT self_subject FROM clients WHERE client_id = ?', (client_id,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    if result and result[0]:
-        return query.replace('@s', result[0])
+    if self_subject:
+        return query.replace('@s', self_subject)
     else:
         raise ValueError('Self-reference @s used but no self_subject set. Use "set self [name]" command first.')
 
+# Search logs are queued and written by a background thread in batches, so a
+# search doesn't pay for a connection and a commit on its response path
+LOG_BATCH_SIZE = 200
+LOG_FLUSH_INTERVAL = 0.1
+
+# WAL pages after which the log writer's commit checkpoints back into the database
+LOG_WAL_AUTOCHECKPOINT = 1000
+
+_log_queue = queue.Queue()
+_log_writer_pid = None
+_log_writer_lock = threading.Lock()
+
+def _search_log_writer():
+    """Write queued search logs, one transaction per batch"""
+    conn = None
+    while True:
+        rows = [_log_queue.get()]
+        deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+        while len(rows) < LOG_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(_log_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        try:
+            if conn is None:
+                conn = connect_db()
+                conn.execute(f'PRAGMA wal_autocheckpoint={LOG_WAL_AUTOCHECKPOINT}')
+            with conn:
+                conn.executemany('''
+                    INSERT INTO search_logs (ip_address, user_agent, query, country, results_count, success, error_message, client_id, search_type, targeted_query, state, status_code, cached)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+        except Exception as e:
+            logger.error("Error logging search: %s", e)
+        finally:
+            for _ in rows:
+                _log_queue.task_done()
+
+def _ensure_log_writer():
+    """Start the log writer thread in this process (workers fork without it)"""
+    global _log_writer_pid
+    if _log_writer_pid != os.getpid():
+        with _log_writer_lock:
+            if _log_writer_pid != os.getpid():
+                threading.Thread(target=_search_log_writer, name='search-log-writer', daemon=True).start()
+                _log_writer_pid = os.getpid()
+
 # Log search to database
-def log_search(ip_address, user_agent, query, country, results_count=0, success=True, error_message=None, client_id=None, search_type='general', targeted_query=None, state=None, status_code=200):
+def log_search(ip_address, user_agent, query, country, results_count=0, success=True, error_message=None, client_id=None, search_type='general', targeted_query=None, state=None, status_code=200, cached=False):
+    _ensure_log_writer()
+    _log_queue.put_nowait((ip_address, user_agent, query, country, results_count, success, error_message, client_id, search_type, targeted_query, state, status_code, cached))
+
+def flush_search_logs():
+    """Block until every queued search log has been written"""
+    if _log_writer_pid == os.getpid():
+        _log_queue.join()
+
+atexit.register(flush_search_logs)
+
+# SERP response cache settings (TTL in seconds, max cached searches)
+SERP_CACHE_TTL = int(os.getenv('SERP_CACHE_TTL', '600'))
+SERP_CACHE_SIZE = int(os.getenv('SERP_CACHE_SIZE', '1024'))
+
+# Results are also stored in the database so every worker shares them and they
+# survive restarts (TTL in seconds, 0 disables)
+SERP_DB_CACHE_TTL = int(os.getenv('SERP_DB_CACHE_TTL', '86400'))
+
+# In-process LRU cache of processed search results: key -> (expires_at, results)
+_serp_cache = OrderedDict()
+_serp_cache_lock = threading.Lock()
+
+# Expired serp_cache rows are purged at most once per SERP_CACHE_TTL per process,
+# not on every cache write
+_serp_cache_next_purge = 0
+
+def serp_cache_key(targeted_query, country):
+    """Build the cache key for a SERP API search"""
+    return 'serp:' + hashlib.sha1(f'{targeted_query}|{country}'.encode()).hexdigest()
+
+def get_cached_results(key):
+    """Return cached search results for key, or None if missing or expired"""
+    with _serp_cache_lock:
+        entry = _serp_cache.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                _serp_cache.move_to_end(key)
+                return entry[1]
+            del _serp_cache[key]
+    
+    if not SERP_DB_CACHE_TTL:
+        return None
+    
+    # Fall back to the shared database cache and keep a hit in memory; an unreadable
+    # or corrupt row is treated as a miss
     try:
-        conn = sqlite3.connect('osint_searches.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO search_logs (ip_address, user_agent, query, country, results_count, success, error_message, client_id, search_type, targeted_query, state, status_code)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (ip_address, user_agent, query, country, results_count, success, error_message, client_id, search_type, targeted_query, state, status_code))
-        
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Error logging search: {e}")
+        row = get_db().execute(
+            'SELECT payload FROM serp_cache WHERE key = ? AND created_at > ?',
+            (key, int(time.time()) - SERP_DB_CACHE_TTL)
+        ).fetchone()
+        if row is None:
+            return None
+        results = orjson.loads(zlib.decompress(row[0]))
+    except (sqlite3.Error, zlib.error, orjson.JSONDecodeError) as e:
+        logger.warning("Error reading SERP cache: %s", e)
+        return None
+    _remember_results(key, results)
+    return results
+
+def _remember_results(key, results):
+    """Store results in the in-process LRU, evicting the least recently used entries when full"""
+    with _serp_cache_lock:
+        _serp_cache.pop(key, None)
+        while len(_serp_cache) >= SERP_CACHE_SIZE:
+            _serp_cache.popitem(last=False)
+        _serp_cache[key] = (time.time() + SERP_CACHE_TTL, results)
+
+def cache_results(key, results):
+    """Store processed search results in memory and in the shared database cache"""
+    global _serp_cache_next_purge
+    _remember_results(key, results)
+    if not SERP_DB_CACHE_TTL:
+        return
+    
+    now = int(time.time())
+    try:
+        conn = get_db()
+        conn.execute('INSERT OR REPLACE INTO serp_cache (key, payload, created_at) VALUES (?, ?, ?)',
+                     (key, zlib.compress(orjson.dumps(results), 1), now))
+        if now >= _serp_cache_next_purge:
+            _serp_cache_next_purge = now + SERP_CACHE_TTL
+            conn.execute('DELETE FROM serp_cache WHERE created_at <= ?', (now - SERP_DB_CACHE_TTL,))
+    except sqlite3.Error as e:
+        logger.warning("Error writing SERP cache: %s", e)
+
+# Fields projected from each SERP API result section as (key, default) pairs.
+# Defaults are shared between results, so they must never be mutated.
+ORGANIC_FIELDS = (
+    ('position', 0), ('title', ''), ('link', ''), ('snippet', ''), ('displayed_link', ''),
+    ('cached_page_link', ''), ('related_pages_link', ''), ('rich_snippet', None),
+    ('sitelinks', ()), ('thumbnail', None),
+)
+NEWS_FIELDS = (
+    ('position', 0), ('title', ''), ('link', ''), ('snippet', ''), ('source', ''),
+    ('date', ''), ('thumbnail', None), ('stories', ()),
+)
+IMAGE_FIELDS = (
+    ('position', 0), ('thumbnail', ''), ('source', ''), ('title', ''), ('link', ''),
+    ('original', ''), ('original_width', None), ('original_height', None), ('is_product', False),
+)
+VIDEO_FIELDS = (
+    ('position', 0), ('title', ''), ('link', ''), ('displayed_link', ''), ('thumbnail', ''),
+    ('duration', ''), ('platform', ''), ('date', ''),
+)
+PEOPLE_ALSO_ASK_FIELDS = (
+    ('question', ''), ('snippet', ''), ('title', ''), ('link', ''), ('displayed_link', ''),
+    ('thumbnail', None),
+)
+RELATED_SEARCH_FIELDS = (
+    ('query', ''), ('link', ''),
+)
+LOCAL_FIELDS = (
+    ('position', 0), ('title', ''), ('place_id', ''), ('data_id', ''), ('data_cid', ''),
+    ('reviews_link', ''), ('photos_link', ''), ('gps_coordinates', {}), ('place_id_search', ''),
+    ('provider_id', ''), ('rating', None), ('reviews', None), ('price', ''), ('type', ''),
+    ('types', ()), ('type_id', ''), ('address', ''), ('open_state', ''), ('hours', ''),
+    ('operating_hours', {}), ('phone', ''), ('website', ''), ('description', ''),
+    ('service_options', {}), ('thumbnail', None),
+)
+SHOPPING_FIELDS = (
+    ('position', 0), ('title', ''), ('link', ''), ('product_link', ''), ('product_id', ''),
+    ('serpapi_product_api', ''), ('source', ''), ('price', ''), ('extracted_price', None),
+    ('rating', None), ('reviews', None), ('extensions', ()), ('thumbnail', None), ('delivery', ''),
+)
+SCHOLARLY_FIELDS = (
+    ('position', 0), ('title', ''), ('link', ''), ('snippet', ''), ('publication_info', {}),
+    ('resources', ()), ('inline_links', {}),
+)
+TOP_STORY_FIELDS = (
+    ('position', 0), ('title', ''), ('link', ''), ('snippet', ''), ('date', ''), ('source', ''),
+    ('thumbnail', None),
+)
+
+# (SERP API key, response key, fields) for every projected result section
+RESULT_SECTIONS = (
+    ('organic_results', 'organic_results', ORGANIC_FIELDS),
+    ('news_results', 'news_results', NEWS_FIELDS),
+    ('images_results', 'image_results', IMAGE_FIELDS),
+    ('video_results', 'video_results', VIDEO_FIELDS),
+    ('people_also_ask', 'people_also_ask', PEOPLE_ALSO_ASK_FIELDS),
+    ('related_searches', 'related_searches', RELATED_SEARCH_FIELDS),
+    ('local_results', 'local_results', LOCAL_FIELDS),
+    ('shopping_results', 'shopping_results', SHOPPING_FIELDS),
+    ('scholarly_articles', 'scholarly_articles', SCHOLARLY_FIELDS),
+    ('top_stories', 'top_stories', TOP_STORY_FIELDS),
+)
+
+# Sections whose items count towards a search's logged results_count
+COUNTED_RESULT_KEYS = ('organic_results', 'news_results', 'image_results', 'video_results',
+                       'local_results', 'shopping_results', 'scholarly_articles', 'top_stories')
+
+def make_projector(name, fields):
+    """Generate a function that copies the given (key, default) fields out of one result"""
+    # Spelling out every key in generated source avoids looping over the field table
+    # per result; defaults are bound as parameter defaults so they load as locals
+    params = ''.join(f', _d{i}=_defaults[{i}]' for i in range(len(fields)))
+    items = ', '.join(f'{key!r}: get({key!r}, _d{i})' for i, (key, _) in enumerate(fields))
+    source = f'def {name}(result{params}):\n    get = result.get\n    return {{{items}}}\n'
+    namespace = {'_defaults': tuple(default for _, default in fields)}
+    exec(source, namespace)
+    return namespace[name]
+
+# (SERP API key, response key, projector) built once from RESULT_SECTIONS
+RESULT_PROJECTORS = tuple(
+    (source_key, result_key, make_projector(f'project_{result_key}', fields))
+    for source_key, result_key, fields in RESULT_SECTIONS
+)
+
+# Top-level SERP API fields used by build_search_results, passed as json_restrictor so
+# SerpAPI omits everything else from the response
+SERP_JSON_RESTRICTOR = ','.join(
+    ('search_information', 'knowledge_graph', 'answer_box') +
+    tuple(source_key for source_key, _, _ in RESULT_SECTIONS)
+)
+
+def link_domain(link):
+    """Return the host name of an http(s) result link, without credentials or port"""
+    if not link.startswith(('http://', 'https://')):
+        return ''
+    try:
+        return urlsplit(link).hostname or ''
+    except ValueError:
+        # Malformed links (e.g. a broken IPv6 literal) just have no domain
+        return ''
+
+def build_search_results(search_results, query, country):
+    """Extract the OSINT-relevant sections from a raw SERP API response"""
+    # Extract comprehensive OSINT information
+    results = {
+        'query': query,
+        'country': country,
+        'search_information': search_results.get('search_information'),
+        'knowledge_graph': search_results.get('knowledge_graph'),
+        'answer_box': search_results.get('answer_box'),
+    }
+    
+    # Project each result section down to the fields the frontend uses; sections
+    # missing from the response share an empty tuple instead of allocating a list
+    for source_key, result_key, project in RESULT_PROJECTORS:
+        items = search_results.get(source_key)
+        results[result_key] = [project(result) for result in items] if items else ()
+    
+    # Organic results also carry source info derived from their link
+    for item, result in zip(results['organic_results'], search_results.get('organic_results', ())):
+        item['source_info'] = {
+            'domain': link_domain(item['link']),
+            'favicon': result.get('favicon'),
+        }
+    
+    return results
 
 # Initialize database on startup
 init_database()
@@ -282,21 +950,140 @@ init_database()
 try:
     migrate_database()
 except Exception as e:
-    print(f"Migration error: {e}")
+    logger.error("Migration error: %s", e)
+
+# main.html has no template markup, so load it once instead of reading and rendering it per request
+def load_index_html():
+    """Read the main page from disk"""
+    with open('main.html', 'rb') as f:
+        return f.read()
+
+INDEX_HTML = load_index_html()
+INDEX_ETAG = hashlib.sha1(INDEX_HTML).hexdigest()
 
 @app.route('/')
 def index():
-    return render_template_string(open('main.html').read())
+    # In debug mode re-read the page so edits show up without a restart
+    if app.debug:
+        response = app.response_class(load_index_html(), mimetype='text/html')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    response = app.response_class(INDEX_HTML, mimetype='text/html')
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    # Browsers revalidating an expired copy get a bodiless 304 when the page is unchanged
+    response.set_etag(INDEX_ETAG)
+    return response.make_conditional(request)
+
+# Constant error bodies serialized once at import; (body, status) pairs
+_ERR_EMPTY_JSON = (orjson.dumps({'error': 'Empty or malformed JSON payload'}), 400)
+_ERR_JSON_NOT_OBJECT = (orjson.dumps({'error': 'JSON payload must be a valid object'}), 400)
+_ERR_JSON_ARRAY = (orjson.dumps({'error': 'JSON payload must be an object, not an array'}), 400)
+_ERR_NO_DATA = (orjson.dumps({'error': 'No search data provided'}), 400)
+_ERR_NO_QUERY = (orjson.dumps({'error': 'Search query is required'}), 400)
+_ERR_QUERY_TOO_LONG = (orjson.dumps({'error': f'Search query must be at most {MAX_QUERY_LENGTH} characters'}), 400)
+_ERR_401 = (orjson.dumps({'error': 'Invalid SERP API key. Please check your API credentials.'}), 401)
+_ERR_403 = (orjson.dumps({'error': 'Access denied. Your SERP API key may have insufficient permissions.'}), 403)
+_ERR_429 = (orjson.dumps({'error': 'Rate limit exceeded. Please try again later.'}), 429)
+_ERR_413 = (orjson.dumps({'error': 'Request body too large'}), 413)
+_ERR_NOT_CONFIGURED = (orjson.dumps({'error': 'Search service is not configured. SERPAPI_API_KEY is not set.'}), 503)
+_ERR_504 = (orjson.dumps({'error': 'Request timeout. The search service is taking too long to respond.'}), 504)
+
+def _err(pair):
+    """Return a prebuilt (body, status) error pair as a JSON response"""
+    body, code = pair
+    return app.response_class(body, status=code, mimetype='application/json')
+
+def read_search_payload(request_obj):
+    """Return (data, None) for a /search JSON object or form, or (None, (log message, error response))"""
+    if not (request_obj.content_type and 'application/json' in request_obj.content_type):
+        # Form data fallback
+        data = request_obj.form.to_dict()
+        if not data:
+            return None, ('No data provided', _err(_ERR_NO_DATA))
+        return data, None
+    
+    # Malformed JSON comes back as None; oversized bodies were already refused with 413
+    raw_data = request_obj.get_json(silent=True, force=True)
+    
+    # Handle various JSON payload types
+    if isinstance(raw_data, dict):
+        return raw_data, None
+    if raw_data is None:
+        return None, ('Empty JSON payload', _err(_ERR_EMPTY_JSON))
+    if isinstance(raw_data, str):
+        return None, ('JSON string payload not supported', _err(_ERR_JSON_NOT_OBJECT))
+    if isinstance(raw_data, list):
+        return None, ('JSON array not supported', _err(_ERR_JSON_ARRAY))
+    type_name = type(raw_data).__name__
+    return None, (f'Unsupported JSON type: {type_name}',
+                  (jsonify({'error': f'Unsupported JSON payload type: {type_name}'}), 400))
+
+def parse_search_request(request_obj):
+    """Extract and validate /search parameters.
+
+    Returns (search_request, error); error is None or (log message, error response),
+    and search_request holds whatever was parsed so failures can still be logged.
+    """
+    search_request = {'query': '', 'country': 'us', 'state': '', 'search_type': 'general', 'include_raw': False}
+    data, error = read_search_payload(request_obj)
+    if error:
+        return search_request, error
+    
+    raw_query = data.get('query', '')
+    query = str(raw_query).strip() if raw_query is not None else ''
+    search_request['query'] = query
+    
+    raw_country = data.get('country', 'us')
+    country = str(raw_country).lower() if raw_country is not None else 'us'
+    search_request['country'] = country
+    
+    # Validate country code before spending an upstream request on it
+    if country not in VALID_COUNTRIES:
+        return search_request, (f'Invalid country: {country}',
+                                (jsonify({'error': f'Unsupported country code: {country}'}), 400))
+    
+    raw_state = data.get('state', '')
+    search_request['state'] = str(raw_state).lower().strip() if raw_state is not None else ''
+    
+    # Search type selects the query modifier; anything but a string falls back to general
+    search_type = data.get('searchType', 'general')
+    if isinstance(search_type, str):
+        search_request['search_type'] = search_type
+    
+    # include_raw may come in the body or as a ?include_raw=1 query argument
+    include_raw = data.get('include_raw', request_obj.args.get('include_raw', ''))
+    search_request['include_raw'] = str(include_raw).lower() in ('1', 'true', 'yes', 'on')
+    
+    if not query:
+        return search_request, ('Empty search query', _err(_ERR_NO_QUERY))
+    
+    if len(query) > MAX_QUERY_LENGTH:
+        search_request['query'] = query[:MAX_QUERY_LENGTH]
+        return search_request, (f'Search query too long ({len(query)} chars)', _err(_ERR_QUERY_TOO_LONG))
+    
+    return search_request, None
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return _err(_ERR_413)
 
 @app.route('/search', methods=['POST'])
+@TOTAL_SECONDS.time()
 def search():
+    # Without an API key every upstream call would fail, so don't make one
+    if not SERPAPI_KEY:
+        return _err(_ERR_NOT_CONFIGURED)
+    
+    # Refresh SERP usage (if stale) while the client is looked up
+    serp_usage_future = prefetch_serp_usage()
+    
     # Client identification and rate limiting
-    client_id = get_or_create_client(request)
+    client_id, allowed, limit_msg = prepare_search_context(request)
     client_ip = get_client_ip(request)
-    user_agent = request.headers.get('User-Agent', 'unknown')[:500]
+    user_agent = get_user_agent(request)
     
     # Check SERP API monthly usage first
-    serp_usage = get_serp_usage()
+    serp_usage = dict(serp_usage_future.result()) if serp_usage_future else get_serp_usage()
     if 'error' not in serp_usage and serp_usage.get('remaining', 0) <= 0:
         log_search(client_ip, user_agent, '', 'us', 0, False, 'SERP API monthly limit exceeded', client_id, status_code=429)
         return jsonify({
@@ -304,8 +1091,7 @@ def search():
             'serp_usage': serp_usage
         }), 429
     
-    # Check daily rate limit for this client
-    allowed, limit_msg = check_rate_limit(client_id)
+    # Enforce the daily rate limit for this client
     if not allowed:
         log_search(client_ip, user_agent, '', 'us', 0, False, f'Rate limit: {limit_msg}', client_id, status_code=429)
         return jsonify({
@@ -314,423 +1100,125 @@ def search():
             'client_id': client_id
         }), 429
     
-    # Initialize variables for logging
-    query = ''
-    country = 'us'
-    search_type = 'general'
-    state = ''
+    # Parse and validate the request before anything is spent on it
+    search_request, error = parse_search_request(request)
+    query = search_request['query']
+    country = search_request['country']
+    search_type = search_request['search_type']
+    state = search_request['state']
+    if error:
+        log_message, error_response = error
+        log_search(client_ip, user_agent, query, country, 0, False, log_message)
+        return error_response
     
     try:
-        # Robust JSON parsing with comprehensive validation
-        data = None
-        
-        
-        # Handle different content types and payload formats
-        if request.content_type and 'application/json' in request.content_type:
-            try:
-                raw_data = request.get_json(silent=True, force=True)
-                # Handle various JSON payload types
-                if raw_data is None:
-                    log_search(client_ip, user_agent, query, country, 0, False, 'Empty JSON payload')
-                    return jsonify({'error': 'Empty or malformed JSON payload'}), 400
-                elif isinstance(raw_data, str):
-                    # JSON string - try to parse it
-                    try:
-                        data = json.loads(raw_data)
-                        if not isinstance(data, dict):
-                            raise ValueError("JSON must be an object")
-                    except (json.JSONDecodeError, ValueError):
-                        log_search(client_ip, user_agent, query, country, 0, False, 'Invalid JSON string format')
-                        return jsonify({'error': 'JSON payload must be a valid object'}), 400
-                elif isinstance(raw_data, dict):
-                    data = raw_data
-                elif isinstance(raw_data, list):
-                    log_search(client_ip, user_agent, query, country, 0, False, 'JSON array not supported')
-                    return jsonify({'error': 'JSON payload must be an object, not an array'}), 400
-                else:
-                    log_search(client_ip, user_agent, query, country, 0, False, f'Unsupported JSON type: {type(raw_data).__name__}')
-                    return jsonify({'error': f'Unsupported JSON payload type: {type(raw_data).__name__}'}), 400
-            except Exception as e:
-                log_search(client_ip, user_agent, query, country, 0, False, f'JSON parsing error: {str(e)}')
-                return jsonify({'error': 'Failed to parse JSON payload'}), 400
-        else:
-            # Try form data as fallback
-            data = request.form.to_dict()
-            if not data:
-                log_search(client_ip, user_agent, query, country, 0, False, 'No data provided')
-                return jsonify({'error': 'No search data provided'}), 400
-        
-        # Validate and extract parameters
-        if not isinstance(data, dict):
-            log_search(client_ip, user_agent, query, country, 0, False, f'Data not dict: {type(data)} = {repr(data)}')
-            return jsonify({'error': 'Invalid request format'}), 400
-        
-        # Extract and validate query
-        raw_query = data.get('query', '')
-        query = str(raw_query).strip() if raw_query is not None else ''
-        
-        # Extract and validate country
-        raw_country = data.get('country', 'us')
-        country = str(raw_country).lower() if raw_country is not None else 'us'
-        
-        # Validate country code
-        valid_countries = ['us', 'gb', 'ca', 'au', 'de', 'fr', 'jp', 'cn', 'in', 'br', 'mx', 'ru', 'it', 'es', 'nl']
-        if country not in valid_countries:
-            country = 'us'
-        
-        # Extract and validate state (optional)
-        raw_state = data.get('state', '')
-        state = str(raw_state).lower().strip() if raw_state is not None else ''
-        
-        # Extract search type for targeted queries
-        search_type = data.get('searchType', 'general')
-        if not isinstance(search_type, str):
-            search_type = 'general'
-        
-        if not query.strip():
-            log_search(client_ip, user_agent, query, country, 0, False, 'Empty search query')
-            return jsonify({'error': 'Search query is required'}), 400
-        
         # Build targeted search query based on search type
         targeted_query = query
         
         # Add search type-specific terms for better OSINT results
-        search_modifiers = {
-            'criminal': f'"{query}" (arrest OR criminal OR conviction OR mugshot OR court)',
-            'court': f'"{query}" (lawsuit OR court case OR civil OR judgment)',
-            'warrants': f'"{query}" (warrant OR wanted OR fugitive)',
-            'bankruptcy': f'"{query}" (bankruptcy OR chapter 7 OR chapter 11 OR debt)',
-            'property': f'"{query}" (property records OR real estate OR deed OR owner)',
-            'deeds': f'"{query}" (deed OR mortgage OR property transfer)',
-            'foreclosure': f'"{query}" (foreclosure OR tax lien OR sheriff sale)',
-            'business_property': f'"{query}" (commercial property OR business real estate)',
-            'birth': f'"{query}" (birth certificate OR birth record OR born)',
-            'death': f'"{query}" (death certificate OR obituary OR died OR deceased)',
-            'marriage': f'"{query}" (marriage certificate OR wedding OR married OR divorce)',
-            'address': f'"{query}" (address OR residence OR lived OR home)',
-            'phone': f'"{query}" (phone number OR telephone OR contact)',
-            'licenses': f'"{query}" (professional license OR certification OR permit)',
-            'business': f'"{query}" (business registration OR LLC OR corporation OR company)',
-            'employment': f'"{query}" (employment OR job OR work OR employer)',
-            'education': f'"{query}" (education OR school OR university OR degree OR alumni)',
-            'patents': f'"{query}" (patent OR trademark OR intellectual property)',
-            'assets': f'"{query}" (assets OR wealth OR financial OR investments)',
-            'corporations': f'"{query}" (corporation OR SEC filing OR executive OR officer)',
-            'sec': f'"{query}" (SEC filing OR insider trading OR executive compensation)',
-            'tax': f'"{query}" (tax records OR IRS OR tax lien OR assessment)',
-            'vehicles': f'"{query}" (vehicle registration OR car OR license plate)',
-            'drivers': f'"{query}" (drivers license OR driving record OR DMV OR DUI)',
-            'aviation': f'"{query}" (aircraft registration OR pilot license OR FAA)',
-            'social': f'"{query}" (Facebook OR Twitter OR Instagram OR LinkedIn OR social media)',
-            'online': f'"{query}" (username OR profile OR account OR online)',
-            'breaches': f'"{query}" (data breach OR password leak OR hack OR exposed)',
-            'websites': f'"{query}" (domain registration OR website owner OR WHOIS)',
-            'medical': f'"{query}" (medical license OR doctor OR physician OR MD)',
-            'sanctions': f'"{query}" (medical sanctions OR excluded provider OR Medicare fraud)',
-            'prescribers': f'"{query}" (DEA prescriber OR controlled substance OR prescription)',
-            'news_criminal': f'"{query}" (arrested OR charged OR convicted OR crime news)',
-            'news_business': f'"{query}" (CEO OR executive OR business news OR scandal)',
-            'investigations': f'"{query}" (investigation OR expose OR corruption OR fraud)',
-            'media': f'"{query}" (interview OR news OR media OR press OR appearance)',
-            'academic': f'"{query}" (research OR publication OR academic OR scholar)',
-            'research': f'"{query}" (research paper OR citation OR study OR journal)',
-            'grants': f'"{query}" (research grant OR funding OR NSF OR NIH)',
-            'university': f'"{query}" (university OR college OR alumni OR faculty)',
-            'military': f'"{query}" (military service OR veteran OR armed forces)',
-            'immigration': f'"{query}" (immigration OR visa OR naturalization OR USCIS)',
-            'political': f'"{query}" (political contribution OR campaign OR PAC OR lobbying)',
-            'nonprofit': f'"{query}" (nonprofit OR charity OR 501c3 OR foundation)',
-            'voter': f'"{query}" (voter registration OR voting record OR election)'
-        }
-        
-        if search_type in search_modifiers:
-            targeted_query = search_modifiers[search_type]
+        format_modifier = SEARCH_MODIFIER_FORMATTERS.get(search_type)
+        if format_modifier:
+            targeted_query = format_modifier(q=query)
         
         # Add state parameter if provided (for location-specific searches)
-        if state:
-            # For US, Canada, Australia - add state/province to query for better location targeting
-            if country in ['us', 'ca', 'au']:
-                targeted_query = f"{targeted_query} {state}"
+        if state and country in STATE_COUNTRIES:
+            targeted_query = f"{targeted_query} {state}"
+        
+        logger.debug("Using targeted query: %s", targeted_query)
         
         # SERP API request with targeted query
-        params = {
-            'q': targeted_query,
-            'api_key': SERPAPI_KEY,
-            'engine': 'google',
-            'gl': country,
-            'num': 10
-        }
+        params = {**SERP_SEARCH_PARAMS, 'q': targeted_query, 'gl': country}
         
         # Search type and targeted query are now working properly
         
-        response = requests.get('https://serpapi.com/search', params=params, timeout=10)
+        # The full SERP API response is only returned on request since it roughly doubles the payload
+        include_raw = search_request['include_raw']
+        search_results = None
         
-        if response.status_code == 200:
-            search_results = response.json()
-            
-            # Extract comprehensive OSINT information
-            results = {
-                'query': query,
-                'country': country,
-                'search_information': search_results.get('search_information'),
-                'organic_results': [],
-                'news_results': [],
-                'image_results': [],
-                'video_results': [],
-                'people_also_ask': [],
-                'related_searches': [],
-                'local_results': [],
-                'shopping_results': [],
-                'scholarly_articles': [],
-                'knowledge_graph': search_results.get('knowledge_graph'),
-                'answer_box': search_results.get('answer_box'),
-                'top_stories': [],
-                'raw_data': search_results  # Full JSON for advanced users
-            }
-            
-            # Process organic results with enhanced metadata
-            if 'organic_results' in search_results:
-                for result in search_results['organic_results']:
-                    organic_item = {
-                        'position': result.get('position', 0),
-                        'title': result.get('title', ''),
-                        'link': result.get('link', ''),
-                        'snippet': result.get('snippet', ''),
-                        'displayed_link': result.get('displayed_link', ''),
-                        'cached_page_link': result.get('cached_page_link', ''),
-                        'related_pages_link': result.get('related_pages_link', ''),
-                        'source_info': {
-                            'domain': result.get('link', '').split('/')[2] if result.get('link', '').startswith('http') else '',
-                            'favicon': result.get('favicon'),
-                        },
-                        'rich_snippet': result.get('rich_snippet'),
-                        'sitelinks': result.get('sitelinks', []),
-                        'thumbnail': result.get('thumbnail')
-                    }
-                    results['organic_results'].append(organic_item)
-            
-            # Process news results with enhanced metadata
-            if 'news_results' in search_results:
-                for result in search_results['news_results']:
-                    news_item = {
-                        'position': result.get('position', 0),
-                        'title': result.get('title', ''),
-                        'link': result.get('link', ''),
-                        'snippet': result.get('snippet', ''),
-                        'source': result.get('source', ''),
-                        'date': result.get('date', ''),
-                        'thumbnail': result.get('thumbnail'),
-                        'stories': result.get('stories', [])  # Related stories
-                    }
-                    results['news_results'].append(news_item)
-            
-            # Process image results for visual OSINT
-            if 'images_results' in search_results:
-                for result in search_results['images_results']:
-                    image_item = {
-                        'position': result.get('position', 0),
-                        'thumbnail': result.get('thumbnail', ''),
-                        'source': result.get('source', ''),
-                        'title': result.get('title', ''),
-                        'link': result.get('link', ''),
-                        'original': result.get('original', ''),
-                        'original_width': result.get('original_width'),
-                        'original_height': result.get('original_height'),
-                        'is_product': result.get('is_product', False)
-                    }
-                    results['image_results'].append(image_item)
-            
-            # Process video results
-            if 'video_results' in search_results:
-                for result in search_results['video_results']:
-                    video_item = {
-                        'position': result.get('position', 0),
-                        'title': result.get('title', ''),
-                        'link': result.get('link', ''),
-                        'displayed_link': result.get('displayed_link', ''),
-                        'thumbnail': result.get('thumbnail', ''),
-                        'duration': result.get('duration', ''),
-                        'platform': result.get('platform', ''),
-                        'date': result.get('date', '')
-                    }
-                    results['video_results'].append(video_item)
-            
-            # Process People Also Ask for related queries
-            if 'people_also_ask' in search_results:
-                for result in search_results['people_also_ask']:
-                    paa_item = {
-                        'question': result.get('question', ''),
-                        'snippet': result.get('snippet', ''),
-                        'title': result.get('title', ''),
-                        'link': result.get('link', ''),
-                        'displayed_link': result.get('displayed_link', ''),
-                        'thumbnail': result.get('thumbnail')
-                    }
-                    results['people_also_ask'].append(paa_item)
-            
-            # Process related searches
-            if 'related_searches' in search_results:
-                for result in search_results['related_searches']:
-                    related_item = {
-                        'query': result.get('query', ''),
-                        'link': result.get('link', '')
-                    }
-                    results['related_searches'].append(related_item)
-            
-            # Process local results (maps, businesses)
-            if 'local_results' in search_results:
-                for result in search_results['local_results']:
-                    local_item = {
-                        'position': result.get('position', 0),
-                        'title': result.get('title', ''),
-                        'place_id': result.get('place_id', ''),
-                        'data_id': result.get('data_id', ''),
-                        'data_cid': result.get('data_cid', ''),
-                        'reviews_link': result.get('reviews_link', ''),
-                        'photos_link': result.get('photos_link', ''),
-                        'gps_coordinates': result.get('gps_coordinates', {}),
-                        'place_id_search': result.get('place_id_search', ''),
-                        'provider_id': result.get('provider_id', ''),
-                        'rating': result.get('rating'),
-                        'reviews': result.get('reviews'),
-                        'price': result.get('price', ''),
-                        'type': result.get('type', ''),
-                        'types': result.get('types', []),
-                        'type_id': result.get('type_id', ''),
-                        'address': result.get('address', ''),
-                        'open_state': result.get('open_state', ''),
-                        'hours': result.get('hours', ''),
-                        'operating_hours': result.get('operating_hours', {}),
-                        'phone': result.get('phone', ''),
-                        'website': result.get('website', ''),
-                        'description': result.get('description', ''),
-                        'service_options': result.get('service_options', {}),
-                        'thumbnail': result.get('thumbnail')
-                    }
-                    results['local_results'].append(local_item)
-            
-            # Process shopping results
-            if 'shopping_results' in search_results:
-                for result in search_results['shopping_results']:
-                    shopping_item = {
-                        'position': result.get('position', 0),
-                        'title': result.get('title', ''),
-                        'link': result.get('link', ''),
-                        'product_link': result.get('product_link', ''),
-                        'product_id': result.get('product_id', ''),
-                        'serpapi_product_api': result.get('serpapi_product_api', ''),
-                        'source': result.get('source', ''),
-                        'price': result.get('price', ''),
-                        'extracted_price': result.get('extracted_price'),
-                        'rating': result.get('rating'),
-                        'reviews': result.get('reviews'),
-                        'extensions': result.get('extensions', []),
-                        'thumbnail': result.get('thumbnail'),
-                        'delivery': result.get('delivery', '')
-                    }
-                    results['shopping_results'].append(shopping_item)
-            
-            # Process scholarly articles
-            if 'scholarly_articles' in search_results:
-                for result in search_results['scholarly_articles']:
-                    scholarly_item = {
-                        'position': result.get('position', 0),
-                        'title': result.get('title', ''),
-                        'link': result.get('link', ''),
-                        'snippet': result.get('snippet', ''),
-                        'publication_info': result.get('publication_info', {}),
-                        'resources': result.get('resources', []),
-                        'inline_links': result.get('inline_links', {})
-                    }
-                    results['scholarly_articles'].append(scholarly_item)
-            
-            # Process top stories
-            if 'top_stories' in search_results:
-                for result in search_results['top_stories']:
-                    story_item = {
-                        'position': result.get('position', 0),
-                        'title': result.get('title', ''),
-                        'link': result.get('link', ''),
-                        'snippet': result.get('snippet', ''),
-                        'date': result.get('date', ''),
-                        'source': result.get('source', ''),
-                        'thumbnail': result.get('thumbnail')
-                    }
-                    results['top_stories'].append(story_item)
-            
-            # Count total results
-            total_results = (len(results.get('organic_results', [])) + 
-                           len(results.get('news_results', [])) +
-                           len(results.get('image_results', [])) +
-                           len(results.get('video_results', [])) +
-                           len(results.get('local_results', [])) +
-                           len(results.get('shopping_results', [])) +
-                           len(results.get('scholarly_articles', [])) +
-                           len(results.get('top_stories', [])))
+        # Without raw data only the projected sections are needed, so let SerpAPI trim the payload
+        if not include_raw:
+            params['json_restrictor'] = SERP_JSON_RESTRICTOR
+        
+        # Serve repeated searches from the cache instead of calling SERP API again
+        cache_key = serp_cache_key(targeted_query, country)
+        results = None if include_raw else get_cached_results(cache_key)
+        cached = results is not None
+        
+        if not cached:
+            with UPSTREAM_SECONDS.time():
+                response = SERP_SESSION.get('https://serpapi.com/search', params=params, timeout=SERP_SEARCH_TIMEOUT)
             
-            # Log successful search (include all tracking info)
-            logged_query = f"[{search_type.upper()}] {query}"
-            if state:
-                logged_query = f"{logged_query} [{state.upper()}]"
-            log_search(client_ip, user_agent, logged_query, country, total_results, True, None, 
-                      client_id, search_type, targeted_query, state, 200)
+            if response.status_code == 401:
+                log_search(client_ip, user_agent, query, country, 0, False, 'Invalid SERP API key')
+                return _err(_ERR_401)
+            elif response.status_code == 403:
+                log_search(client_ip, user_agent, query, country, 0, False, 'Access denied - insufficient permissions')
+                return _err(_ERR_403)
+            elif response.status_code == 429:
+                log_search(client_ip, user_agent, query, country, 0, False, 'Rate limit exceeded')
+                return _err(_ERR_429)
+            elif response.status_code != 200:
+                error_msg = f'SERP API error: {response.status_code}'
+                log_search(client_ip, user_agent, query, country, 0, False, error_msg)
+                return jsonify({'error': error_msg}), 500
             
-            # Create response with client ID cookie and all search results
-            final_response = {
-                'organic_results': results['organic_results'],
-                'news_results': results['news_results'],
-                'image_results': results['image_results'],
-                'video_results': results['video_results'],
-                'local_results': results['local_results'],
-                'shopping_results': results['shopping_results'],
-                'scholarly_articles': results['scholarly_articles'],
-                'related_searches': results['related_searches'],
-                'people_also_ask': results['people_also_ask'],
-                'top_stories': results['top_stories'],
-                'search_information': results['search_information'],
-                'knowledge_graph': results['knowledge_graph'],
-                'answer_box': results['answer_box'],
-                'query': results['query'],
-                'country': results['country'],
-                'raw_data': results['raw_data'],
-                'client_id': client_id,
-                'rate_limit_status': limit_msg
-            }
+            record_serp_search()
             
-            response_obj = make_response(jsonify(final_response))
+            with PARSE_SECONDS.time():
+                search_results = orjson.loads(response.content)
+            with PROJECT_SECONDS.time():
+                results = build_search_results(search_results, query, country)
+            cache_results(cache_key, results)
+        
+        # Count total results
+        total_results = sum(len(results[key]) for key in COUNTED_RESULT_KEYS)
+        
+        # Log successful search (include all tracking info)
+        logged_query = f"[{search_type.upper()}] {query}"
+        if state:
+            logged_query = f"{logged_query} [{state.upper()}]"
+        log_search(client_ip, user_agent, logged_query, country, total_results, True, None, 
+                  client_id, search_type, targeted_query, state, 200, cached)
+        
+        # Create response with client ID cookie and all search results; results may be
+        # the cached dict, so it is copied rather than updated in place
+        final_response = {
+            **results,
+            'query': query,
+            'country': country,
+            'client_id': client_id,
+            'rate_limit_status': limit_msg
+        }
+        if include_raw:
+            final_response['raw_data'] = search_results  # Full JSON for advanced users
+        
+        with SERIALIZE_SECONDS.time():
+            body = orjson.dumps(final_response)
+        response_obj = app.response_class(body, mimetype='application/json')
+        # Only send the cookie when the browser doesn't already hold this client_id
+        if request.cookies.get('client_id') != client_id:
             response_obj.set_cookie('client_id', client_id, max_age=365*24*60*60, 
                                    httponly=True, secure=request.is_secure, samesite='Lax')
-            return response_obj
-        elif response.status_code == 401:
-            log_search(client_ip, user_agent, query, country, 0, False, 'Invalid SERP API key')
-            return jsonify({'error': 'Invalid SERP API key. Please check your API credentials.'}), 401
-        elif response.status_code == 403:
-            log_search(client_ip, user_agent, query, country, 0, False, 'Access denied - insufficient permissions')
-            return jsonify({'error': 'Access denied. Your SERP API key may have insufficient permissions.'}), 403
-        elif response.status_code == 429:
-            log_search(client_ip, user_agent, query, country, 0, False, 'Rate limit exceeded')
-            return jsonify({'error': 'Rate limit exceeded. Please try again later.'}), 429
-        else:
-            error_msg = f'SERP API error: {response.status_code}'
-            log_search(client_ip, user_agent, query, country, 0, False, error_msg)
-            return jsonify({'error': error_msg}), 500
+        return response_obj
             
     except requests.exceptions.Timeout:
         log_search(client_ip, user_agent, query, country, 0, False, 'Request timeout')
-        return jsonify({'error': 'Request timeout. The search service is taking too long to respond.'}), 504
+        return _err(_ERR_504)
     except requests.exceptions.RequestException as e:
-        error_msg = f'Network error: {str(e)}'
+        error_msg = redact_url_queries(f'Network error: {str(e)}')
         log_search(client_ip, user_agent, query, country, 0, False, error_msg)
         return jsonify({'error': error_msg}), 500
     except Exception as e:
         error_msg = str(e)
+        logger.exception('Search failed (query_len=%d country=%s search_type=%s)',
+                         len(query), country, search_type)
         log_search(client_ip, user_agent, query, country, 0, False, error_msg)
         return jsonify({'error': error_msg}), 500
 
 @app.route('/search-history')
 def search_history():
     try:
-        conn = sqlite3.connect('osint_searches.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         # Get pagination parameters
@@ -738,105 +1226,128 @@ def search_history():
         per_page = min(request.args.get('per_page', 50, type=int), 100)  # Limit max per page
         offset = (page - 1) * per_page
         
-        # Get total count
-        cursor.execute('SELECT COUNT(*) FROM search_logs')
-        total_count = cursor.fetchone()[0]
+        # Keyset pagination: the timestamp and id of the last log already shown
+        before_ts = request.args.get('before_ts')
+        before_id = request.args.get('before_id', type=int)
         
-        # Get search logs with pagination
-        cursor.execute('''
-            SELECT id, timestamp, ip_address, user_agent, query, country, 
-                   results_count, success, error_message
-            FROM search_logs 
-            ORDER BY timestamp DESC 
-            LIMIT ? OFFSET ?
-        ''', (per_page, offset))
+        # Get total count from the trigger-maintained counter instead of counting the log
+        cursor.execute("SELECT value FROM stats_totals WHERE key = 'total_searches'")
+        row = cursor.fetchone()
+        total_count = row[0] if row else 0
         
-        logs = []
-        for row in cursor.fetchall():
-            logs.append({
-                'id': row[0],
-                'timestamp': row[1],
-                'ip_address': row[2],
-                'user_agent': row[3],
-                'query': row[4],
-                'country': row[5],
-                'results_count': row[6],
-                'success': bool(row[7]),
-                'error_message': row[8]
-            })
+        # Get search logs with pagination; a keyset seeks straight to the next page
+        # in the timestamp index instead of stepping over every skipped row
+        if before_ts is not None and before_id is not None:
+            cursor.execute('''
+                SELECT id, timestamp, ip_address, user_agent, query, country, 
+                       results_count, success, error_message
+                FROM search_logs 
+                WHERE (timestamp, id) < (?, ?)
+                ORDER BY timestamp DESC, id DESC 
+                LIMIT ?
+            ''', (before_ts, before_id, per_page + 1))
+        else:
+            cursor.execute('''
+                SELECT id, timestamp, ip_address, user_agent, query, country, 
+                       results_count, success, error_message
+                FROM search_logs 
+                ORDER BY timestamp DESC, id DESC 
+                LIMIT ? OFFSET ?
+            ''', (per_page + 1, offset))
         
-        conn.close()
+        # Build the page straight from the cursor rather than a fetchall() row list
+        logs = [{
+            'id': log_id,
+            'timestamp': timestamp,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'query': query,
+            'country': country,
+            'results_count': results_count,
+            'success': bool(success),
+            'error_message': error_message
+        } for log_id, timestamp, ip_address, user_agent, query, country,
+              results_count, success, error_message in cursor]
+        
+        # One extra row is fetched to tell whether another page follows
+        has_more = len(logs) > per_page
+        del logs[per_page:]
+        
+        # Keyset for the following page, or None once the log is exhausted
+        next_cursor = None
+        if has_more:
+            next_cursor = {'before_ts': logs[-1]['timestamp'], 'before_id': logs[-1]['id']}
         
         return jsonify({
             'logs': logs,
             'total_count': total_count,
             'page': page,
             'per_page': per_page,
-            'total_pages': (total_count + per_page - 1) // per_page
+            'total_pages': (total_count + per_page - 1) // per_page,
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/search-stats')
-def search_stats():
-    try:
-        conn = sqlite3.connect('osint_searches.db')
-        cursor = conn.cursor()
-        
-        # Get basic statistics
-        cursor.execute('SELECT COUNT(*) FROM search_logs')
-        total_searches = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM search_logs WHERE success = 1')
-        successful_searches = cursor.fetchone()[0]
+# /search-stats is polled by dashboards, so its result is reused for SEARCH_STATS_TTL
+# seconds; the lock makes a burst of requests share one computation
+SEARCH_STATS_TTL = int(os.getenv('SEARCH_STATS_TTL', '60'))
+
+_search_stats_cache = {'data': None, 'expires': 0}
+_search_stats_lock = threading.Lock()
+
+def compute_search_stats():
+    """Read the search statistics from the stats counters"""
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    # Read every statistic from the same snapshot of the log
+    with conn:
+        cursor.execute('BEGIN')
         
-        cursor.execute('SELECT COUNT(DISTINCT ip_address) FROM search_logs')
-        unique_ips = cursor.fetchone()[0]
+        # Totals and top lists come from the trigger-maintained counters
+        cursor.execute('SELECT key, value FROM stats_totals')
+        totals = dict(cursor.fetchall())
+        total_searches = totals.get('total_searches', 0)
+        successful_searches = totals.get('successful_searches', 0)
+        unique_ips = totals.get('unique_ips', 0)
         
         # Get top queries
-        cursor.execute('''
-            SELECT query, COUNT(*) as count 
-            FROM search_logs 
-            WHERE success = 1
-            GROUP BY query 
-            ORDER BY count DESC 
-            LIMIT 10
-        ''')
+        cursor.execute('SELECT query, count FROM stats_by_query ORDER BY count DESC LIMIT 10')
         top_queries = [{'query': row[0], 'count': row[1]} for row in cursor.fetchall()]
         
         # Get top countries
-        cursor.execute('''
-            SELECT country, COUNT(*) as count 
-            FROM search_logs 
-            WHERE success = 1
-            GROUP BY country 
-            ORDER BY count DESC 
-            LIMIT 10
-        ''')
+        cursor.execute('SELECT country, count FROM stats_by_country ORDER BY count DESC LIMIT 10')
         top_countries = [{'country': row[0], 'count': row[1]} for row in cursor.fetchall()]
         
         # Get searches by day (last 7 days)
         cursor.execute('''
-            SELECT DATE(timestamp) as date, COUNT(*) as count 
-            FROM search_logs 
-            WHERE timestamp >= datetime('now', '-7 days')
-            GROUP BY DATE(timestamp)
+            SELECT date, count FROM stats_by_day
+            WHERE date >= DATE('now', '-7 days')
             ORDER BY date DESC
         ''')
         daily_searches = [{'date': row[0], 'count': row[1]} for row in cursor.fetchall()]
-        
-        conn.close()
-        
-        return jsonify({
-            'total_searches': total_searches,
-            'successful_searches': successful_searches,
-            'unique_ips': unique_ips,
-            'success_rate': round((successful_searches / total_searches * 100), 2) if total_searches > 0 else 0,
-            'top_queries': top_queries,
-            'top_countries': top_countries,
-            'daily_searches': daily_searches
-        })
+    
+    return {
+        'total_searches': total_searches,
+        'successful_searches': successful_searches,
+        'unique_ips': unique_ips,
+        'success_rate': round((successful_searches / total_searches * 100), 2) if total_searches > 0 else 0,
+        'top_queries': top_queries,
+        'top_countries': top_countries,
+        'daily_searches': daily_searches
+    }
+
+@app.route('/search-stats')
+def search_stats():
+    try:
+        with _search_stats_lock:
+            if _search_stats_cache['data'] is None or time.time() >= _search_stats_cache['expires']:
+                _search_stats_cache['data'] = compute_search_stats()
+                _search_stats_cache['expires'] = time.time() + SEARCH_STATS_TTL
+            stats = _search_stats_cache['data']
+        return jsonify(stats)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -846,10 +1357,10 @@ def health():
     # Also check database health
     db_healthy = False
     try:
-        conn = sqlite3.connect('osint_searches.db')
+        conn = get_db()
         cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM search_logs')
-        conn.close()
+        # Reading one row proves the database and table are readable without counting the log
+        cursor.execute('SELECT 1 FROM search_logs LIMIT 1')
         db_healthy = True
     except Exception:
         pass
@@ -860,6 +1371,16 @@ def health():
         'database_healthy': db_healthy
     })
 
+@app.route('/metrics')
+def metrics():
+    # Under Gunicorn with PROMETHEUS_MULTIPROC_DIR set, aggregate every worker's samples
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return app.response_class(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
 # Admin panel routes
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
@@ -869,101 +1390,33 @@ def admin_login():
             session['admin_authenticated'] = True
             return redirect(url_for('admin_dashboard'))
         else:
-            return render_template_string('''
-            <!DOCTYPE html>
-            <html><head><title>Admin Login - OSINT Tool</title></head>
-            <body style="font-family: Arial; background: #f0f0f0; padding: 50px;">
-                <div style="max-width: 400px; margin: auto; background: white; padding: 30px; border-radius: 10px; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
-                    <h2 style="color: #e74c3c; text-align: center;">❌ Invalid Password</h2>
-                    <form method="post" style="margin-top: 20px;">
-                        <input type="password" name="password" placeholder="Admin Password" required 
-                               style="width: 100%; padding: 15px; border: 1px solid #ddd; border-radius: 5px; margin-bottom: 15px;">
-                        <button type="submit" style="width: 100%; padding: 15px; background: #3498db; color: white; border: none; border-radius: 5px; cursor: pointer;">Login</button>
-                    </form>
-                    <p style="text-align: center; margin-top: 20px; color: #7f8c8d; font-size: 14px;">🔒 Admin Panel Access Required</p>
-                </div>
-            </body></html>
-            ''')
+            return render_template('admin_login.html', invalid=True)
     
-    return render_template_string('''
-    <!DOCTYPE html>
-    <html><head><title>Admin Login - OSINT Tool</title></head>
-    <body style="font-family: Arial; background: #f0f0f0; padding: 50px;">
-        <div style="max-width: 400px; margin: auto; background: white; padding: 30px; border-radius: 10px; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
-            <h2 style="text-align: center; color: #2c3e50;">🔐 Admin Panel</h2>
-            <form method="post" style="margin-top: 20px;">
-                <input type="password" name="password" placeholder="Admin Password" required 
-                       style="width: 100%; padding: 15px; border: 1px solid #ddd; border-radius: 5px; margin-bottom: 15px;">
-                <button type="submit" style="width: 100%; padding: 15px; background: #3498db; color: white; border: none; border-radius: 5px; cursor: pointer;">Login</button>
-            </form>
-            <p style="text-align: center; margin-top: 20px; color: #7f8c8d; font-size: 14px;">🛡️ Administrator Access Only</p>
-        </div>
-    </body></html>
-    ''')
+    return render_template('admin_login.html', invalid=False)
 
 @app.route('/admin')
 @require_admin
 def admin_dashboard():
     serp_usage = get_serp_usage()
     
-    conn = sqlite3.connect('osint_searches.db')
+    conn = get_db()
     cursor = conn.cursor()
     
-    # Get client statistics
-    cursor.execute('SELECT COUNT(*) FROM clients')
-    total_clients = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM clients WHERE unlimited = 1')
-    unlimited_clients = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM search_logs WHERE timestamp >= date("now", "start of day")')
-    today_searches = cursor.fetchone()[0]
-    
-    conn.close()
+    # Get client statistics in one statement; today's searches come from the daily counter
+    cursor.execute('''
+        SELECT COUNT(*), COALESCE(SUM(unlimited = 1), 0),
+               COALESCE((SELECT count FROM stats_by_day WHERE date = DATE('now')), 0)
+        FROM clients
+    ''')
+    total_clients, unlimited_clients, today_searches = cursor.fetchone()
     
-    return render_template_string('''
-    <!DOCTYPE html>
-    <html><head><title>Admin Dashboard - OSINT Tool</title></head>
-    <body style="font-family: Arial; background: #f8f9fa; padding: 20px;">
-        <div style="max-width: 1200px; margin: auto;">
-            <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 30px;">
-                <h1 style="color: #2c3e50;">🛠️ Admin Dashboard</h1>
-                <div>
-                    <a href="/admin/clients" style="margin-right: 10px; padding: 10px 20px; background: #3498db; color: white; text-decoration: none; border-radius: 5px;">👥 Clients</a>
-                    <a href="/terminal" style="margin-right: 10px; padding: 10px 20px; background: #27ae60; color: white; text-decoration: none; border-radius: 5px;">💻 Terminal</a>
-                    <a href="/" style="padding: 10px 20px; background: #95a5a6; color: white; text-decoration: none; border-radius: 5px;">🏠 Home</a>
-                </div>
-            </div>
-            
-            <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); gap: 20px; margin-bottom: 30px;">
-                <div style="background: white; padding: 20px; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                    <h3 style="color: #3498db; margin-top: 0;">📊 SERP API Usage</h3>
-                    <p><strong>Used:</strong> {{ serp_usage.get('used_this_month', 'N/A') }}</p>
-                    <p><strong>Limit:</strong> {{ serp_usage.get('monthly_limit', 'N/A') }}</p>
-                    <p><strong>Remaining:</strong> {{ serp_usage.get('remaining', 'N/A') }}</p>
-                    <p><strong>Plan:</strong> {{ serp_usage.get('plan_name', 'N/A') }}</p>
-                </div>
-                
-                <div style="background: white; padding: 20px; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                    <h3 style="color: #e74c3c; margin-top: 0;">👥 Client Stats</h3>
-                    <p><strong>Total Clients:</strong> {{ total_clients }}</p>
-                    <p><strong>Unlimited:</strong> {{ unlimited_clients }}</p>
-                    <p><strong>Regular:</strong> {{ total_clients - unlimited_clients }}</p>
-                </div>
-                
-                <div style="background: white; padding: 20px; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                    <h3 style="color: #27ae60; margin-top: 0;">🔍 Today's Activity</h3>
-                    <p><strong>Searches Today:</strong> {{ today_searches }}</p>
-                </div>
-            </div>
-        </div>
-    </body></html>
-    ''', serp_usage=serp_usage, total_clients=total_clients, unlimited_clients=unlimited_clients, today_searches=today_searches)
+    return render_template('admin_dashboard.html', serp_usage=serp_usage, total_clients=total_clients,
+                           unlimited_clients=unlimited_clients, today_searches=today_searches)
 
 @app.route('/admin/clients')
 @require_admin
 def admin_clients():
-    conn = sqlite3.connect('osint_searches.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -977,7 +1430,6 @@ def admin_clients():
     ''')
     
     clients = cursor.fetchall()
-    conn.close()
     
     client_list = ''
     for client in clients:
@@ -1038,7 +1490,7 @@ def admin_clients():
 def admin_toggle_unlimited():
     client_id = request.form.get('client_id')
     
-    conn = sqlite3.connect('osint_searches.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('SELECT unlimited FROM clients WHERE client_id = ?', (client_id,))
@@ -1047,9 +1499,7 @@ def admin_toggle_unlimited():
     if result:
         new_unlimited = not result[0]
         cursor.execute('UPDATE clients SET unlimited = ? WHERE client_id = ?', (new_unlimited, client_id))
-        conn.commit()
     
-    conn.close()
     return redirect(url_for('admin_clients'))
 
 # Terminal interface
@@ -1225,11 +1675,9 @@ def terminal_exec():
                 name = name_part
             
             # Update client's self_subject
-            conn = sqlite3.connect('osint_searches.db')
+            conn = get_db()
             cursor = conn.cursor()
             cursor.execute('UPDATE clients SET self_subject = ? WHERE client_id = ?', (name, client_id))
-            conn.commit()
-            conn.close()
             
             return f'<span style="color: #00ff00;">✅ Self-reference set to:</span> {name}'
         
@@ -1259,14 +1707,19 @@ def terminal_exec():
             if not query:
                 return '<span style="color: #ff0000;">❌ Error: No search query provided</span>'
             
+            # Load the rate limit settings and self_subject in one query
+            cursor = get_db().cursor()
+            cursor.execute('SELECT daily_limit, unlimited, unlimited_until, self_subject FROM clients WHERE client_id = ?', (client_id,))
+            client_row = cursor.fetchone()
+            
             # Substitute @s reference
             try:
-                query = substitute_self_reference(query, client_id)
+                query = substitute_self_reference(query, client_row[3] if client_row else None)
             except ValueError as e:
                 return f'<span style="color: #ff0000;">❌ Error: {str(e)}</span>'
             
             # Check rate limits first
-            allowed, limit_msg = check_rate_limit(client_id)
+            allowed, limit_msg = rate_limit_status(cursor, client_id, client_row[:3] if client_row else None)
             if not allowed:
                 return f'<span style="color: #ff0000;">❌ Rate Limited: {limit_msg}</span>'
             
@@ -1290,4 +1743,5 @@ if __name__ == '__main__':
         print("Error: SERPAPI_API_KEY not found in environment variables")
         print("Please set your SERP API key as an environment variable before running the application.")
         exit(1)
-    app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
+    # Serve each request on its own thread so slow SERP API calls don't block other clients
+    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
\ No newline at end of file
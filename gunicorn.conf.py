@@ -0,0 +1,45 @@
+import os
+import multiprocessing
+
+# Production server settings: gunicorn -c gunicorn.conf.py app:app
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Searches are mostly spent waiting on the SERP API, so each worker process
+# multiplexes requests over a pool of threads
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = 8
+
+# Keep client connections open between requests
+keepalive = 30
+
+# With gthread this is the worker heartbeat, not a per-request limit: a worker is
+# restarted only if its main loop stalls this long. It still exceeds the worst-case
+# search (one connect timeout plus two slow 5xx responses from the SERP API, under 25s)
+timeout = 30
+
+# Import the app once in the master so module-level state (HTTP session,
+# cached page, lookup tables) is shared copy-on-write by the workers
+preload_app = True
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's Prometheus samples when multiprocess metrics are enabled
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    # Move everything imported by the preloaded app into the permanent GC generation
+    # so collections in the workers don't write to, and un-share, the parent's pages
+    import gc
+    gc.freeze()
+
+
+def on_starting(server):
+    # Refuse to start without a SERP API key, as `python app.py` does, rather
+    # than serving a search endpoint that can only fail
+    from app import SERPAPI_KEY
+    if not SERPAPI_KEY:
+        raise RuntimeError('SERPAPI_API_KEY not found in environment variables')